@@ -1,7 +1,9 @@
 """Интерфейс командной строки для Vehicle OCR."""
 
 import argparse
+import logging
 import sys
+from multiprocessing import freeze_support
 from pathlib import Path
 
 from vehicle_ocr import VehicleParser, Settings
@@ -42,6 +44,13 @@ def main():
 
     args = parser.parse_args()
 
+    # Сообщения пайплайна (ошибки документов, пропуски стратегий) — в stderr
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format="%(levelname)s: %(message)s",
+        stream=sys.stderr
+    )
+
     # Проверка входной директории
     if not args.input.exists():
         print(f"Ошибка: директория не найдена: {args.input}", file=sys.stderr)
@@ -62,22 +71,26 @@ def main():
     # Обработка
     ocr_parser = VehicleParser(settings)
 
-    image_count = len(list(args.input.glob("*.[jJpP][pPnN][gG]")) +
-                      list(args.input.glob("*.[jJ][pP][eE][gG]")))
-
     if not args.quiet:
+        image_count = len(ocr_parser.list_images(args.input))
         print(f"\nНайдено изображений: {image_count} в {args.input}\n")
 
-    results = ocr_parser.process_directory(args.input)
+    with ocr_parser:
+        results = ocr_parser.process_directory(args.input)
 
-    # Вывод результатов
-    for result in results:
-        if not args.quiet:
-            print(f"{'=' * 50}")
-            print(f"Файл: {result.file}")
-            print(f"  Гос.номер:    {result.reg_number or 'не найден'}")
-            print(f"  VIN:          {result.vin or 'не найден'}")
-            print(f"  Номер кузова: {result.body_number or 'не найден'}")
+    # Вывод результатов — одной записью, а не print на каждую строку
+    if not args.quiet:
+        lines = []
+        for result in results:
+            lines += [
+                "=" * 50,
+                f"Файл: {result.file}",
+                f"  Гос.номер:    {result.reg_number or 'не найден'}",
+                f"  VIN:          {result.vin or 'не найден'}",
+                f"  Номер кузова: {result.body_number or 'не найден'}",
+            ]
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
 
     # Сохранение
     output_data = ocr_parser.save_results(results, args.output)
@@ -98,4 +111,5 @@ def main():
 
 
 if __name__ == "__main__":
+    freeze_support()
     sys.exit(main())
@@ -1,5 +1,6 @@
 """Конфигурация приложения через Pydantic."""
 
+from functools import lru_cache
 from pathlib import Path
 from pydantic_settings import BaseSettings
 from pydantic import Field
@@ -16,10 +17,23 @@ class Settings(BaseSettings):
     tesseract_lang: str = Field(default="eng")
     tesseract_psm: int = Field(default=6)
 
+    # Параллельная обработка (None — по числу ядер)
+    max_workers: int | None = Field(default=None)
+    ocr_threads: int = Field(default=4)  # Потоки OCR внутри документа
+    ocr_batch_size: int = Field(default=0)  # Пакетный OCR через файл-список, 0 — выкл.
+
+    # Гос.номер и VIN одним OCR общего региона (с добором по отдельности)
+    combined_region_ocr: bool = Field(default=True)
+
+    # Мультистратегия номера кузова: досрочный выход при N совпадениях
+    consensus_threshold: int = Field(default=3)
+
     # Предобработка изображений
     clahe_clip_limit: float = Field(default=2.0)
     clahe_tile_size: int = Field(default=8)
     min_image_height: int = Field(default=800)  # Увеличивать если меньше
+    max_image_height: int = Field(default=2000)  # Уменьшать если больше
+    max_region_side: int = Field(default=1600)  # Длинная сторона региона гос.номера
     upscale_method: str = Field(default="cubic")  # linear, cubic, lanczos
 
     # Извлечение регионов (процент от высоты изображения)
@@ -38,10 +52,12 @@ class Settings(BaseSettings):
     model_config = {
         "env_prefix": "VOCR_",
         "env_file": ".env",
-        "extra": "ignore"
+        "extra": "ignore",
+        "frozen": True
     }
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Получить синглтон настроек."""
+    """Получить синглтон настроек (окружение и .env читаются один раз)."""
     return Settings()
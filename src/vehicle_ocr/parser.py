@@ -1,72 +1,313 @@
 """Парсер документов ТС — извлечение данных из СТС."""
 
+import itertools
 import json
+import logging
+import multiprocessing
+import os
 import re
-from collections import Counter
+import tempfile
+import threading
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, NamedTuple, Optional
 
 import cv2
 import numpy as np
 import pytesseract
-from PIL import Image
 
 from vehicle_ocr.config import Settings, get_settings
 from vehicle_ocr.preprocessor import ImagePreprocessor
 
+try:
+    from tesserocr import PyTessBaseAPI
+except ImportError:  # tesserocr опционален — без него OCR идёт через pytesseract
+    PyTessBaseAPI = None
 
-class ExtractionResult:
-    """Контейнер результатов извлечения."""
+try:
+    import orjson
+except ImportError:  # orjson опционален — без него JSON пишет стандартный json
+    orjson = None
 
-    def __init__(
+logger = logging.getLogger(__name__)
+
+# Сколько файлов декодируется заранее при последовательной обработке
+_PREFETCH_DEPTH = 2
+
+
+class ExtractionResult(NamedTuple):
+    """Контейнер результатов извлечения (кортеж без словаря атрибутов)."""
+
+    file: str
+    reg_number: Optional[str] = None
+    vin: Optional[str] = None
+    body_number: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+class ResultsTable:
+    """Результаты обработки в колоночном виде: по списку на каждое поле.
+
+    Итерация возвращает строки как `ExtractionResult`.
+    """
+
+    def __init__(self):
+        self.files: list[str] = []
+        self.reg_numbers: list[Optional[str]] = []
+        self.vins: list[Optional[str]] = []
+        self.body_numbers: list[Optional[str]] = []
+
+    @classmethod
+    def from_results(cls, results: Iterable[ExtractionResult]) -> "ResultsTable":
+        table = cls()
+        for result in results:
+            table.add(result)
+        return table
+
+    def append(
         self,
         file: str,
         reg_number: Optional[str] = None,
         vin: Optional[str] = None,
         body_number: Optional[str] = None
     ):
-        self.file = file
-        self.reg_number = reg_number
-        self.vin = vin
-        self.body_number = body_number
+        self.files.append(file)
+        self.reg_numbers.append(reg_number)
+        self.vins.append(vin)
+        self.body_numbers.append(body_number)
 
-    def to_dict(self) -> dict:
-        return {
-            "file": self.file,
-            "reg_number": self.reg_number,
-            "vin": self.vin,
-            "body_number": self.body_number
-        }
+    def add(self, result: ExtractionResult):
+        self.append(*result)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __iter__(self) -> Iterator[ExtractionResult]:
+        rows = zip(self.files, self.reg_numbers, self.vins, self.body_numbers)
+        return map(ExtractionResult._make, rows)
+
+    def to_dicts(self) -> list[dict]:
+        return [
+            {"file": file, "reg_number": reg_number, "vin": vin, "body_number": body_number}
+            for file, reg_number, vin, body_number in zip(
+                self.files, self.reg_numbers, self.vins, self.body_numbers
+            )
+        ]
 
 
 class VehicleParser:
     """Основной парсер документов регистрации ТС (СТС)."""
 
-    # Паттерн российского гос.номера: Х000ХХ00 или Х000ХХ000
+    # Паттерн российского гос.номера (выходной вид): Х000ХХ00 или Х000ХХ000
     REG_NUMBER_PATTERN = re.compile(r'[АВЕКМНОРСТУХ]\d{3}[АВЕКМНОРСТУХ]{2}\d{2,3}')
 
+    # Тот же паттерн для внутреннего поиска по ASCII (латинские двойники)
+    _REG_NUMBER_LATIN = re.compile(r'[ABEKMHOPCTYX]\d{3}[ABEKMHOPCTYX]{2}\d{2,3}')
+
     # Паттерн VIN: 17 буквенно-цифровых символов (без I, O, Q по ISO 3779)
     VIN_PATTERN = re.compile(r'[A-HJ-NPR-Z0-9]{17}')
 
+    # Расширения обрабатываемых изображений (для str.endswith)
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.bmp')
+
+    # PSM режимы для OCR региона VIN: следующий режим запускается,
+    # только если предыдущие не дали VIN
+    _VIN_PSM_MODES = (6, 3)
+
+    # Белые списки символов Tesseract по полям: классификатор перебирает
+    # меньше глифов и не путает 0/O, 1/I. Для гос.номера — латинские
+    # и кириллические буквы номера (зависит от tesseract_lang)
+    _REG_NUMBER_WHITELIST = 'ABEKMHOPCTYXАВЕКМНОРСТУХ0123456789'
+    _VIN_WHITELIST = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+
+    # Общий регион гос.номера и VIN: допустимы символы обоих полей
+    _COMBINED_WHITELIST = ''.join(sorted(set(_REG_NUMBER_WHITELIST + _VIN_WHITELIST)))
+
+    # Очистка текста OCR перед поиском VIN
+    _NON_VIN_CHARS = re.compile(r'[^A-Z0-9]')
+
+    # Все (в т.ч. перекрывающиеся) 17-символьные окна VIN за один проход.
+    # Работает по ASCII-байтам: кандидаты сразу идут ключами Counter и в numpy
+    _VIN_WINDOW = re.compile(rb'(?=([A-HJ-NPR-Z0-9]{17}))')
+
+    # Если первые стратегии перебора не дали ни одного кандидата,
+    # регион считается нечитаемым и остальные стратегии пропускаются
+    _SWEEP_PROBE_STRATEGIES = 6
+
+    # Построчный поиск гос.номера: очистка строки и удаление цифр
+    # (после очистки остаются только буквы номера и цифры)
+    _NON_REG_CHARS = re.compile(r'[^ABEKMHOPCTYX0-9]')
+    _DROP_DIGITS = str.maketrans('', '', '0123456789')
+
     def __init__(self, settings: Settings | None = None):
         self.settings = settings or get_settings()
         self.preprocessor = ImagePreprocessor(self.settings)
 
-    def _run_ocr(self, image: np.ndarray, psm: int | None = None) -> str:
-        """Запуск Tesseract OCR на изображении."""
-        psm = psm or self.settings.tesseract_psm
+        # tesserocr API не потокобезопасен — по экземпляру на поток
+        self._local = threading.local()
+        self._apis = []
+        self._apis_lock = threading.Lock()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Освобождение ресурсов Tesseract (потоки OCR и in-process API)."""
+        executor = getattr(self, '_executor', None)
+        if executor is not None:
+            executor.shutdown()
+            self._executor = None
+
+        for api in getattr(self, '_apis', ()):
+            api.End()
+        self._apis = []
+        self._local = threading.local()
+
+    def _clear_apis(self):
+        """Сброс изображений и результатов OCR между документами.
+
+        API (и загруженная модель) остаются жить до `close()`, освобождается
+        только память под последний регион. Вызывается, когда OCR документа
+        завершён и потоки пула простаивают.
+        """
+        with self._apis_lock:
+            for api in self._apis:
+                api.Clear()
+
+    def _get_api(self):
+        """Ленивая инициализация tesserocr API для текущего потока.
+
+        Языковая модель загружается один раз на поток и переиспользуется
+        всеми последующими вызовами OCR.
+        """
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            api = PyTessBaseAPI(lang=self.settings.tesseract_lang)
+            self._local.api = api
+            with self._apis_lock:
+                self._apis.append(api)
+        return api
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков для параллельных вызовов OCR.
+
+        Пул живёт вместе с парсером, чтобы потоки (и их API) не
+        пересоздавались для каждого документа.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.settings.ocr_threads)
+        return self._executor
+
+    @staticmethod
+    def _tesseract_config(psm: int, whitelist: str | None = None) -> str:
+        """Параметры командной строки Tesseract для pytesseract."""
         config = f'--psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist={whitelist}'
+        return config
+
+    def _run_ocr(
+        self,
+        image: np.ndarray,
+        psm: int | None = None,
+        whitelist: str | None = None
+    ) -> str:
+        """Запуск Tesseract OCR на изображении в оттенках серого.
+
+        `whitelist` — допустимые символы (None — без ограничений).
+        """
+        psm = psm or self.settings.tesseract_psm
+
+        if PyTessBaseAPI is None:
+            # Временный PGM пишется напрямую из numpy — без объекта PIL
+            # и PNG-кодирования; строковый путь pytesseract не перекодирует
+            fd, image_path = tempfile.mkstemp(suffix='.pgm')
+            os.close(fd)
+            try:
+                cv2.imwrite(image_path, image)
+                return pytesseract.image_to_string(
+                    image_path,
+                    lang=self.settings.tesseract_lang,
+                    config=self._tesseract_config(psm, whitelist)
+                )
+            finally:
+                os.remove(image_path)
+
+        # Буфер numpy передаётся как есть (1 байт на пиксель), без PIL
+        image = np.ascontiguousarray(image)
+        height, width = image.shape
+
+        # API общий для всех полей потока — белый список задаётся каждый раз
+        api = self._get_api()
+        api.SetVariable('tessedit_char_whitelist', whitelist or '')
+        api.SetPageSegMode(psm)
+        api.SetImageBytes(image.tobytes(), width, height, 1, width)
+        return api.GetUTF8Text()
+
+    def _run_ocr_modes(
+        self,
+        image: np.ndarray,
+        psms: Iterable[int],
+        whitelist: str | None = None
+    ) -> Iterator[str]:
+        """OCR одного изображения последовательно в нескольких режимах PSM.
+
+        С tesserocr изображение передаётся в API один раз: между режимами
+        меняется только PSM, а SetRectangle сбрасывает результаты прошлого
+        распознавания без повторного копирования буфера.
 
-        pil_image = Image.fromarray(image)
-        text = pytesseract.image_to_string(
-            pil_image,
-            lang=self.settings.tesseract_lang,
-            config=config
+        Ошибка OCR в одном режиме даёт пустой текст и не прерывает
+        следующие режимы; ошибка подготовки API пробрасывается.
+        """
+        if PyTessBaseAPI is None:
+            for psm in psms:
+                try:
+                    text = self._run_ocr(image, psm=psm, whitelist=whitelist)
+                except Exception:
+                    text = ''
+                yield text
+            return
+
+        image = np.ascontiguousarray(image)
+        height, width = image.shape
+
+        api = self._get_api()
+        api.SetVariable('tessedit_char_whitelist', whitelist or '')
+        api.SetImageBytes(image.tobytes(), width, height, 1, width)
+        for psm in psms:
+            try:
+                api.SetPageSegMode(psm)
+                api.SetRectangle(0, 0, width, height)
+                text = api.GetUTF8Text()
+            except Exception:
+                text = ''
+            yield text
+
+    def extract_reg_number(self, image: np.ndarray, enhanced: bool = False) -> Optional[str]:
+        """Извлечение гос.номера из изображения.
+
+        `enhanced=True` — к странице уже применён CLAHE.
+        """
+        text = self._run_ocr(
+            self._reg_number_region(image, enhanced),
+            whitelist=self._REG_NUMBER_WHITELIST
         )
-        return text
+        return self._parse_reg_number(text)
 
-    def extract_reg_number(self, image: np.ndarray) -> Optional[str]:
-        """Извлечение гос.номера из изображения."""
+    def _reg_number_region(self, image: np.ndarray, enhanced: bool = False) -> np.ndarray:
+        """Подготовка региона гос.номера к OCR."""
         height = image.shape[0]
 
         # Извлекаем регион где обычно находится гос.номер
@@ -76,40 +317,102 @@ class VehicleParser:
             self.settings.reg_number_region_end
         )
 
-        # Для маленьких изображений увеличиваем регион
+        # Для маленьких изображений увеличиваем регион, для больших —
+        # ограничиваем длинную сторону
         if height < self.settings.min_image_height:
             region = self.preprocessor.upscale_if_needed(region)
+        else:
+            region = self.preprocessor.downscale_if_needed(region)
+
+        return region if enhanced else self.preprocessor.enhance_contrast(region)
 
-        processed = self.preprocessor.enhance_contrast(region)
-        text = self._run_ocr(processed)
+    def _parse_reg_number(self, text: str) -> Optional[str]:
+        """Поиск гос.номера в тексте OCR.
 
-        # Нормализуем латиницу в кириллицу
-        normalized = self.preprocessor.normalize_to_cyrillic(text.upper())
+        Поиск идёт по ASCII-тексту (кириллические двойники приведены к
+        латинице), в кириллицу переводится только найденный номер.
+        """
+        normalized = self.preprocessor.normalize_to_latin(text)
 
-        # Ищем совпадения по паттерну
-        matches = self.REG_NUMBER_PATTERN.findall(normalized)
-        if matches:
-            return matches[0].replace(' ', '').replace('\n', '')
+        # Ищем первое совпадение по паттерну (остальные не нужны)
+        match = self._REG_NUMBER_LATIN.search(normalized)
+        if match:
+            return self.preprocessor.normalize_to_cyrillic(match.group())
 
         # Запасной вариант: поиск построчно
         for line in normalized.split('\n'):
-            cleaned = re.sub(r'[^А-Я0-9]', '', line)
+            cleaned = self._NON_REG_CHARS.sub('', line)
 
             if self.settings.min_reg_number_length <= len(cleaned) <= self.settings.max_reg_number_length:
-                has_letters = bool(re.search(r'[А-Я]', cleaned))
-                has_digits = bool(re.search(r'\d', cleaned))
-
-                if has_letters and has_digits:
-                    letter_count = sum(1 for c in cleaned if c.isalpha())
-                    digit_count = sum(1 for c in cleaned if c.isdigit())
+                # Буквы и цифры считаются за один проход translate;
+                # диапазоны ниже заодно требуют наличия и тех, и других
+                letter_count = len(cleaned.translate(self._DROP_DIGITS))
+                digit_count = len(cleaned) - letter_count
 
-                    if 3 <= letter_count <= 4 and 4 <= digit_count <= 6:
-                        return cleaned
+                if 3 <= letter_count <= 4 and 4 <= digit_count <= 6:
+                    return self.preprocessor.normalize_to_cyrillic(cleaned)
 
         return None
 
-    def extract_vin(self, image: np.ndarray) -> Optional[str]:
-        """Извлечение VIN из документа."""
+    def extract_vin(self, image: np.ndarray, enhanced: bool = False) -> Optional[str]:
+        """Извлечение VIN из документа.
+
+        `enhanced=True` — к странице уже применён CLAHE.
+        """
+        processed = self._vin_region(image, enhanced)
+
+        # Каскад PSM режимов: выходим, только если режим дал VIN целым
+        # словом. Иначе выбираем из окон всех режимов вместе — окна могут
+        # склеиваться из соседних строк подписей. Сбой одного режима
+        # не отменяет следующие (см. `_run_ocr_modes`)
+        candidates = []
+        try:
+            for text in self._run_ocr_modes(processed, self._VIN_PSM_MODES, self._VIN_WHITELIST):
+                strict = self._vin_tokens(text)
+                if strict:
+                    return self._select_vin(strict)
+                candidates.extend(self._vin_windows(text))
+        except Exception:
+            pass
+
+        return self._select_vin(candidates)
+
+    def _extract_both(self, image: np.ndarray) -> tuple[Optional[str], Optional[str]]:
+        """Гос.номер и VIN одним вызовом OCR по объединённому региону.
+
+        Ожидает страницу с уже применённым CLAHE. Текст широкой полосы
+        шумный, поэтому принимаются только строгие совпадения: гос.номер —
+        по полному паттерну (без построчного поиска), VIN — только целым
+        словом из 17 символов. Всё остальное (и ошибка OCR) — None, такое
+        поле ищет отдельный экстрактор своего региона.
+        """
+        s = self.settings
+        height = image.shape[0]
+        region = self.preprocessor.extract_region(
+            image,
+            min(s.reg_number_region_start, s.vin_region_start),
+            max(s.reg_number_region_end, s.vin_region_end)
+        )
+
+        # Размер — как у региона гос.номера: маленькие страницы увеличиваем,
+        # у больших ограничиваем длинную сторону
+        if height < s.min_image_height:
+            region = self.preprocessor.upscale_if_needed(region)
+        else:
+            region = self.preprocessor.downscale_if_needed(region)
+
+        try:
+            text = self._run_ocr(region, whitelist=self._COMBINED_WHITELIST)
+        except Exception:
+            return None, None
+
+        match = self._REG_NUMBER_LATIN.search(self.preprocessor.normalize_to_latin(text))
+        reg_number = self.preprocessor.normalize_to_cyrillic(match.group()) if match else None
+
+        return reg_number, self._select_vin(self._vin_tokens(text))
+
+    def _vin_region(self, image: np.ndarray, enhanced: bool = False) -> np.ndarray:
+        """Подготовка региона VIN к OCR."""
         # Извлекаем регион где обычно находится VIN
         region = self.preprocessor.extract_region(
             image,
@@ -117,43 +420,104 @@ class VehicleParser:
             self.settings.vin_region_end
         )
 
-        # Всегда увеличиваем регион VIN для стабильности OCR
+        # Всегда масштабируем регион VIN для стабильности OCR
         region = self.preprocessor.upscale_if_needed(region)
-        processed = self.preprocessor.enhance_contrast(region)
+        return region if enhanced else self.preprocessor.enhance_contrast(region)
+
+    def _vin_windows(self, text: str) -> list[bytes]:
+        """Все 17-символьные кандидаты VIN в тексте OCR (ASCII-байты)."""
+        cleaned = self._NON_VIN_CHARS.sub('', text.upper()).encode('ascii')
+        if len(cleaned) < 17:
+            return []
+        return [m.group(1) for m in self._VIN_WINDOW.finditer(cleaned)]
+
+    def _vin_tokens(self, text: str) -> list[bytes]:
+        """Кандидаты VIN, занимающие слово текста OCR целиком (ASCII-байты).
 
+        В отличие от `_vin_windows`, VIN не склеивается из соседних слов
+        и строк — такое совпадение считается надёжным.
+        """
         candidates = []
+        for token in text.split():
+            cleaned = self._NON_VIN_CHARS.sub('', token.upper())
+            if self.VIN_PATTERN.fullmatch(cleaned):
+                candidates.append(cleaned.encode('ascii'))
+        return candidates
+
+    def _select_vin(self, candidates: list[bytes]) -> Optional[str]:
+        """Выбор VIN среди кандидатов по структуре."""
+        if not candidates:
+            return None
 
-        # Пробуем несколько PSM режимов и собираем кандидатов
-        for psm in [3, 6]:
-            try:
-                text = self._run_ocr(processed, psm=psm).upper()
-                cleaned = re.sub(r'[^A-Z0-9]', '', text)
+        # Возвращаем кандидата с лучшим скором (при равенстве — первого)
+        scores = self._vin_structure_scores(candidates, letter_weight=10)
+        return candidates[int(np.argmax(scores))].decode('ascii')
 
-                # Ищем все возможные 17-символьные последовательности VIN
-                for i in range(len(cleaned) - 16):
-                    candidate = cleaned[i:i + 17]
-                    if self.VIN_PATTERN.match(candidate):
-                        candidates.append(candidate)
+    @staticmethod
+    def _vin_structure_scores(candidates: list[bytes], letter_weight: int) -> np.ndarray:
+        """Оценка кандидатов на основе структуры VIN, сразу для всех.
 
-            except Exception:
-                pass
+        Кандидаты (17 символов A-Z/0-9) кодируются в матрицу байтов N×17:
+        - VIN должен начинаться с буквы (WMI код страны) — `letter_weight`
+        - позиции 10-17 (серийный номер) должны содержать цифры — +1 за цифру
+        """
+        codes = np.frombuffer(b''.join(candidates), dtype=np.uint8)
+        codes = codes.reshape(-1, 17)
 
-        if not candidates:
-            return None
+        starts_with_letter = (codes[:, 0] >= ord('A')) & (codes[:, 0] <= ord('Z'))
+        serial = codes[:, 9:]
+        serial_digits = ((serial >= ord('0')) & (serial <= ord('9'))).sum(axis=1)
 
-        # Оценка кандидатов на основе структуры VIN
-        def vin_score(vin: str) -> int:
-            score = 0
-            # VIN должен начинаться с буквы (WMI код страны)
-            if vin[0].isalpha():
-                score += 10
-            # Позиции 10-17 (серийный номер) должны содержать цифры
-            serial = vin[9:17]
-            score += sum(1 for c in serial if c.isdigit())
-            return score
+        return starts_with_letter * letter_weight + serial_digits
 
-        # Возвращаем кандидата с лучшим скором
-        return max(candidates, key=vin_score)
+    def batch_ocr(
+        self,
+        images: list[np.ndarray],
+        psm: int,
+        whitelist: str | None = None
+    ) -> list[str]:
+        """OCR набора изображений одним запуском Tesseract.
+
+        Изображения сохраняются во временный каталог (PGM без сжатия), их
+        пути — в файл-список, который Tesseract обрабатывает целиком
+        с однократной загрузкой модели. Тексты страниц в выводе разделены
+        символом `\\f`.
+        """
+        if not images:
+            return []
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_dir = Path(tmp_dir)
+            image_paths = []
+            for i, image in enumerate(images):
+                image_path = tmp_dir / f"{i:05d}.pgm"
+                cv2.imwrite(str(image_path), image)
+                image_paths.append(str(image_path))
+
+            list_path = tmp_dir / "list.txt"
+            list_path.write_text("\n".join(image_paths) + "\n", encoding="utf-8")
+
+            # Строковый путь pytesseract передаёт Tesseract как есть
+            output = pytesseract.image_to_string(
+                str(list_path),
+                lang=self.settings.tesseract_lang,
+                config=self._tesseract_config(psm, whitelist)
+            )
+
+        pages = output.split("\f")
+        if len(pages) < len(images):
+            raise RuntimeError(
+                f"Tesseract вернул {len(pages)} страниц вместо {len(images)}"
+            )
+        return pages[:len(images)]
+
+    def _ocr_vin_candidates(self, image: np.ndarray, psm: int) -> list[bytes]:
+        """OCR изображения и поиск 17-символьных кандидатов VIN (ASCII-байты)."""
+        try:
+            text = self._run_ocr(image, psm=psm, whitelist=self._VIN_WHITELIST)
+        except Exception:
+            return []
+        return self._vin_windows(text)
 
     def _extract_with_multiple_strategies(
         self,
@@ -163,93 +527,144 @@ class VehicleParser:
     ) -> Optional[str]:
         """Извлечение номера с использованием множества стратегий предобработки.
 
-        Использует консенсус: пробует 36 комбинаций параметров и выбирает
-        кандидата, который встречается чаще всего.
+        Ожидает изображение в оттенках серого. Использует консенсус:
+        перебирает до 36 комбинаций параметров (от самых удачных к менее
+        удачным) и выбирает кандидата, который встречается чаще всего.
+        Перебор прекращается, как только один кандидат набрал
+        `consensus_threshold` совпадений, или если первые
+        `_SWEEP_PROBE_STRATEGIES` стратегий не дали ни одного кандидата.
         """
         region = self.preprocessor.extract_region(image, region_start, region_end)
 
-        all_candidates = []
-
-        # Вариации стратегий
+        # Вариации стратегий, каждый список — в порядке приоритета
         clahe_params = [(2.0, 8), (3.0, 8), (2.0, 4), (1.5, 16)]
-        scale_factors = [1.0, 1.5, 2.0] if region.shape[0] >= 200 else [2.0, 2.5, 3.0]
-        psm_modes = [3, 6, 11]
-
-        for clip_limit, tile_size in clahe_params:
-            for scale in scale_factors:
-                # Масштабирование
-                if scale != 1.0:
-                    new_h = int(region.shape[0] * scale)
-                    new_w = int(region.shape[1] * scale)
-                    scaled = cv2.resize(region, (new_w, new_h), interpolation=cv2.INTER_CUBIC)
-                else:
-                    scaled = region
+        scale_factors = [1.5, 1.0, 2.0] if region.shape[0] >= 200 else [2.5, 2.0, 3.0]
+        psm_modes = [6, 3, 11]
+
+        # Рабочая высота ограничена сверху: большие регионы не раздуваем
+        max_scale = self.settings.max_image_height / region.shape[0]
+        scale_factors = list(dict.fromkeys(min(scale, max_scale) for scale in scale_factors))
+
+        strategies = [
+            (clahe_param, scale, psm)
+            for clahe_param in clahe_params
+            for scale in scale_factors
+            for psm in psm_modes
+        ]
+
+        # Масштабы и CLAHE считаются лениво и один раз на комбинацию,
+        # а не на каждый вызов OCR
+        scaled_variants = {}
+        enhanced_variants = {}
+
+        # Объекты CLAHE — по одному на набор параметров, а не на комбинацию
+        clahes = {
+            (clip_limit, tile_size): cv2.createCLAHE(
+                clipLimit=clip_limit, tileGridSize=(tile_size, tile_size)
+            )
+            for clip_limit, tile_size in clahe_params
+        }
 
-                # Конвертация в grayscale
-                if len(scaled.shape) == 3:
-                    gray = cv2.cvtColor(scaled, cv2.COLOR_BGR2GRAY)
-                else:
-                    gray = scaled
-
-                # Применяем CLAHE с текущими параметрами
-                clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile_size, tile_size))
-                enhanced = clahe.apply(gray)
-
-                # Пробуем разные PSM режимы
-                for psm in psm_modes:
-                    try:
-                        text = pytesseract.image_to_string(
-                            Image.fromarray(enhanced),
-                            lang=self.settings.tesseract_lang,
-                            config=f'--psm {psm}'
-                        ).upper()
-
-                        cleaned = re.sub(r'[^A-Z0-9]', '', text)
-
-                        for i in range(len(cleaned) - 16):
-                            candidate = cleaned[i:i + 17]
-                            if self.VIN_PATTERN.match(candidate):
-                                all_candidates.append(candidate)
-                    except Exception:
-                        pass
-
-        if not all_candidates:
-            return None
+        def enhanced_for(clahe_param: tuple[float, int], scale: float) -> np.ndarray:
+            key = (clahe_param, scale)
+            if key not in enhanced_variants:
+                if scale not in scaled_variants:
+                    if scale != 1.0:
+                        new_h = int(region.shape[0] * scale)
+                        new_w = int(region.shape[1] * scale)
+                        # INTER_AREA быстрее и точнее при уменьшении
+                        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+                        scaled_variants[scale] = cv2.resize(
+                            region, (new_w, new_h), interpolation=interpolation
+                        )
+                    else:
+                        scaled_variants[scale] = region
+
+                enhanced_variants[key] = clahes[clahe_param].apply(scaled_variants[scale])
+            return enhanced_variants[key]
 
         # Подсчёт частоты — консенсусный подход
-        counter = Counter(all_candidates)
+        counter = Counter()
+
+        # OCR идёт раундами по числу потоков (Tesseract отпускает GIL),
+        # после каждого раунда проверяем консенсус
+        executor = self._get_executor()
+        round_size = self.settings.ocr_threads
+        for start in range(0, len(strategies), round_size):
+            batch = strategies[start:start + round_size]
+            images = [enhanced_for(clahe_param, scale) for clahe_param, scale, _ in batch]
+            psms = [psm for _, _, psm in batch]
+
+            for candidates in executor.map(self._ocr_vin_candidates, images, psms):
+                counter.update(candidates)
+
+            if counter and counter.most_common(1)[0][1] >= self.settings.consensus_threshold:
+                break
+
+            done = start + len(batch)
+            if not counter and done >= self._SWEEP_PROBE_STRATEGIES:
+                logger.info(
+                    "Номер кузова: %d стратегий без кандидатов, пропущено ещё %d",
+                    done, len(strategies) - done
+                )
+                break
+
+        if not counter:
+            return None
 
         # Скор: частота + качество структуры
-        def combined_score(item):
-            candidate, count = item
-            struct_score = 0
-            if candidate[0].isalpha():
-                struct_score += 5
-            struct_score += sum(1 for c in candidate[9:17] if c.isdigit())
-            return count * 10 + struct_score
-
-        best = max(counter.items(), key=combined_score)
-        return best[0]
+        candidates = list(counter)
+        counts = np.fromiter(counter.values(), dtype=np.int64, count=len(counter))
+        scores = counts * 10 + self._vin_structure_scores(candidates, letter_weight=5)
+        return candidates[int(np.argmax(scores))].decode('ascii')
 
     def extract_body_number(self, image: np.ndarray) -> Optional[str]:
-        """Извлечение номера кузова из документа."""
+        """Извлечение номера кузова из документа (в оттенках серого)."""
         return self._extract_with_multiple_strategies(
             image,
             self.settings.body_number_region_start,
             self.settings.body_number_region_end
         )
 
-    def parse_document(self, image_path: str | Path) -> ExtractionResult:
-        """Обработка одного документа."""
+    def parse_document(
+        self,
+        image_path: str | Path,
+        image: np.ndarray | None = None
+    ) -> ExtractionResult:
+        """Обработка одного документа.
+
+        Если изображение уже декодировано, его можно передать в `image` —
+        файл тогда повторно не читается. Цветное (BGR) изображение
+        переводится в оттенки серого здесь, один раз на документ.
+        """
         image_path = Path(image_path)
-        image = cv2.imread(str(image_path))
+        if image is None:
+            image = self.preprocessor.load_grayscale(image_path)
 
         if image is None:
             raise ValueError(f"Не удалось прочитать изображение: {image_path}")
 
-        reg_number = self.extract_reg_number(image)
-        vin = self.extract_vin(image)
-        body_number = self.extract_body_number(image)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        # CLAHE один раз на всю страницу: регионы гос.номера и VIN
+        # перекрываются и берутся срезами. Мультистратегии номера кузова
+        # нужен исходный grayscale — свои параметры CLAHE она подбирает сама
+        enhanced_page = self.preprocessor.enhance_contrast(image)
+
+        try:
+            reg_number = vin = None
+            if self.settings.combined_region_ocr:
+                reg_number, vin = self._extract_both(enhanced_page)
+
+            # Недостающие поля — по своим регионам
+            if reg_number is None:
+                reg_number = self.extract_reg_number(enhanced_page, enhanced=True)
+            if vin is None:
+                vin = self.extract_vin(enhanced_page, enhanced=True)
+            body_number = self.extract_body_number(image)
+        finally:
+            self._clear_apis()
 
         return ExtractionResult(
             file=image_path.name,
@@ -258,44 +673,266 @@ class VehicleParser:
             body_number=body_number
         )
 
-    def process_directory(self, directory: str | Path) -> list[ExtractionResult]:
+    def list_images(self, directory: str | Path) -> list[Path]:
+        """Отсортированный список изображений в директории.
+
+        os.scandir отдаёт имя и тип записи без отдельного stat и без
+        создания Path на каждый файл каталога.
+        """
+        with os.scandir(directory) as entries:
+            paths = sorted(
+                entry.path for entry in entries
+                if entry.name.lower().endswith(self.IMAGE_EXTENSIONS) and entry.is_file()
+            )
+        return [Path(path) for path in paths]
+
+    def process_directory(self, directory: str | Path) -> ResultsTable:
         """Обработка всех изображений в директории."""
-        directory = Path(directory)
-        results = []
+        image_files = self.list_images(directory)
+
+        if self.settings.ocr_batch_size > 0:
+            return self._process_batched(image_files)
+
+        workers = min(self.settings.max_workers or os.cpu_count() or 1, len(image_files))
+        if workers <= 1:
+            return self._process_sequential(image_files)
+
+        # Документы независимы — распределяем их по процессам.
+        # Параллелизм уже на уровне процессов, поэтому в каждом процессе
+        # OCR идёт в один поток: пул потоков мультистратегии не создаётся
+        worker_settings = self.settings.model_copy(update={"ocr_threads": 1})
+
+        # spawn: не форкаем процесс с живыми потоками OCR и API Tesseract
+        mp_context = multiprocessing.get_context('spawn')
+
+        # Логи рабочих процессов идут через очередь в логгеры этого процесса
+        log_queue = mp_context.Queue()
+        listener = QueueListener(log_queue, _ParentLogHandler())
+        listener.start()
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(worker_settings, log_queue, logger.getEffectiveLevel())
+            ) as executor:
+                # OpenMP внутри Tesseract ограничиваем одним потоком. Переменная
+                # читается при загрузке библиотеки, поэтому нужна только на время
+                # запуска процессов: map отправляет все задачи сразу, и процессы
+                # стартуют внутри него
+                with _default_env('OMP_THREAD_LIMIT', '1'):
+                    rows = executor.map(_parse_in_worker, image_files, chunksize=1)
+
+                results = ResultsTable()
+                for result in rows:
+                    results.add(result)
+                return results
+        finally:
+            listener.stop()
+
+    def _process_batched(self, image_files: list[Path]) -> ResultsTable:
+        """Обработка пакетами: регионы гос.номера и VIN всех документов
+        пакета распознаются одним запуском Tesseract на каждый PSM.
+
+        Номер кузова (мультистратегия с консенсусом) по-прежнему ищется
+        по каждому документу отдельно. При сбое пакетного OCR пакет
+        обрабатывается по одному документу.
+        """
+        results = ResultsTable()
+        batch_size = self.settings.ocr_batch_size
 
-        image_extensions = {'.jpg', '.jpeg', '.png', '.tiff', '.bmp'}
-        image_files = sorted([
-            f for f in directory.iterdir()
-            if f.suffix.lower() in image_extensions
-        ])
+        for start in range(0, len(image_files), batch_size):
+            batch_files = image_files[start:start + batch_size]
 
-        for image_file in image_files:
+            loaded = [(f, self._load_quietly(f)) for f in batch_files]
+            documents = [(f, image) for f, image in loaded if image is not None]
             try:
-                result = self.parse_document(image_file)
-                results.append(result)
+                enhanced_pages = [
+                    self.preprocessor.enhance_contrast(image) for _, image in documents
+                ]
+                reg_texts = self.batch_ocr(
+                    [self._reg_number_region(page, enhanced=True) for page in enhanced_pages],
+                    self.settings.tesseract_psm,
+                    self._REG_NUMBER_WHITELIST
+                )
+                vin_regions = [self._vin_region(page, enhanced=True) for page in enhanced_pages]
+                vin_candidates = self._batch_vin_candidates(vin_regions)
             except Exception as e:
-                print(f"Ошибка обработки {image_file.name}: {e}")
-                results.append(ExtractionResult(file=image_file.name))
+                logger.warning("Ошибка пакетного OCR, обработка по одному документу: %s", e)
+                for image_file, image in loaded:
+                    results.add(self._parse_document_safe(image_file, image))
+                continue
+
+            # Результаты OCR по документам: (текст гос.номера, кандидаты VIN)
+            ocr_texts = iter(zip(reg_texts, vin_candidates))
+
+            for image_file, image in loaded:
+                if image is None:
+                    # parse_document повторит чтение и сообщит об ошибке
+                    results.add(self._parse_document_safe(image_file))
+                    continue
+
+                reg_text, doc_vin_candidates = next(ocr_texts)
+                try:
+                    results.append(
+                        file=image_file.name,
+                        reg_number=self._parse_reg_number(reg_text),
+                        vin=self._select_vin(doc_vin_candidates),
+                        body_number=self.extract_body_number(image)
+                    )
+                except Exception as e:
+                    logger.error("Ошибка обработки %s: %s", image_file.name, e)
+                    results.append(file=image_file.name)
+                finally:
+                    self._clear_apis()
+
+        return results
+
+    def _batch_vin_candidates(self, regions: list[np.ndarray]) -> list[list[bytes]]:
+        """Пакетный OCR регионов VIN каскадом PSM режимов.
+
+        Возвращает кандидатов VIN по каждому региону. Как и в `extract_vin`,
+        регион выходит из каскада, только когда режим дал VIN целым словом
+        (кандидатами тогда становятся такие слова); остальные идут
+        в следующий режим и копят окна всех режимов.
+        """
+        candidates = [[] for _ in regions]
+        pending = list(range(len(regions)))
+
+        for psm in self._VIN_PSM_MODES:
+            if not pending:
+                break
+            pages = self.batch_ocr([regions[i] for i in pending], psm, self._VIN_WHITELIST)
+            still_pending = []
+            for i, page in zip(pending, pages):
+                strict = self._vin_tokens(page)
+                if strict:
+                    candidates[i] = strict
+                else:
+                    candidates[i].extend(self._vin_windows(page))
+                    still_pending.append(i)
+            pending = still_pending
+
+        return candidates
+
+    def _load_quietly(self, image_path: Path) -> np.ndarray | None:
+        """Загрузка изображения; при ошибке — None (её покажет parse_document)."""
+        try:
+            return self.preprocessor.load_grayscale(image_path)
+        except Exception:
+            return None
+
+    def _process_sequential(self, image_files: list[Path]) -> ResultsTable:
+        """Последовательная обработка с упреждающим декодированием.
+
+        Пока идёт OCR текущего документа, фоновые потоки декодируют
+        следующие `_PREFETCH_DEPTH` файлов.
+        """
+        results = ResultsTable()
+        files = iter(image_files)
+
+        with ThreadPoolExecutor(max_workers=_PREFETCH_DEPTH) as loader:
+            pending = deque(
+                (f, loader.submit(self._load_quietly, f))
+                for f in itertools.islice(files, _PREFETCH_DEPTH)
+            )
+
+            while pending:
+                image_file, future = pending.popleft()
+
+                next_file = next(files, None)
+                if next_file is not None:
+                    pending.append(
+                        (next_file, loader.submit(self._load_quietly, next_file))
+                    )
+
+                results.add(self._parse_document_safe(image_file, future.result()))
 
         return results
 
-    def save_results(self, results: list[ExtractionResult], output_path: str | Path):
+    def _parse_document_safe(
+        self,
+        image_path: Path,
+        image: np.ndarray | None = None
+    ) -> ExtractionResult:
+        """Обработка документа с подавлением ошибок (пустой результат)."""
+        try:
+            return self.parse_document(image_path, image)
+        except Exception as e:
+            logger.error("Ошибка обработки %s: %s", image_path.name, e)
+            return ExtractionResult(file=image_path.name)
+
+    def save_results(
+        self,
+        results: ResultsTable | Iterable[ExtractionResult],
+        output_path: str | Path
+    ):
         """Сохранение результатов в JSON файл."""
         output_path = Path(output_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
+        if not isinstance(results, ResultsTable):
+            results = ResultsTable.from_results(results)
+
         output_data = {
-            "documents": [r.to_dict() for r in results],
+            "documents": results.to_dicts(),
             "total_processed": len(results),
             "statistics": {
-                "reg_numbers_found": sum(1 for r in results if r.reg_number),
-                "vins_found": sum(1 for r in results if r.vin),
-                "body_numbers_found": sum(1 for r in results if r.body_number)
+                "reg_numbers_found": sum(1 for x in results.reg_numbers if x),
+                "vins_found": sum(1 for x in results.vins if x),
+                "body_numbers_found": sum(1 for x in results.body_numbers if x)
             },
             "version": "1.0.0"
         }
 
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            # UTF-8 без экранирования, отступ 2 — как у json.dump ниже
+            output_path.write_bytes(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(output_data, f, ensure_ascii=False, indent=2)
 
         return output_data
+
+
+# Парсер рабочего процесса: создаётся один раз на процесс и переиспользуется
+_worker_parser: VehicleParser | None = None
+
+
+@contextmanager
+def _default_env(name: str, value: str):
+    """Временно задаёт переменную окружения, если пользователь её не задал."""
+    if name in os.environ:
+        yield
+        return
+
+    os.environ[name] = value
+    try:
+        yield
+    finally:
+        os.environ.pop(name, None)
+
+
+class _ParentLogHandler(logging.Handler):
+    """Передаёт записи из рабочих процессов логгерам родительского процесса."""
+
+    def emit(self, record: logging.LogRecord):
+        logging.getLogger(record.name).handle(record)
+
+
+def _init_worker(settings: Settings, log_queue=None, log_level: int = logging.WARNING):
+    """Инициализация рабочего процесса пула."""
+    global _worker_parser
+    if log_queue is not None:
+        root = logging.getLogger()
+        root.handlers = [QueueHandler(log_queue)]
+        root.setLevel(log_level)
+
+    # Собственный пул потоков OpenCV в каждом процессе только мешает
+    cv2.setNumThreads(1)
+    _worker_parser = VehicleParser(settings)
+
+
+def _parse_in_worker(image_path: Path) -> ExtractionResult:
+    """Обработка документа в рабочем процессе (кортеж компактно пиклится)."""
+    return _worker_parser._parse_document_safe(image_path)
@@ -1,44 +1,73 @@
 """Предобработка изображений для OCR."""
 
+import string
+from pathlib import Path
+
 import cv2
 import numpy as np
-from vehicle_ocr.config import Settings
+from vehicle_ocr.config import Settings, get_settings
 
 
 class ImagePreprocessor:
     """Обработка изображений для улучшения качества OCR."""
 
-    def __init__(self, settings: Settings | None = None):
-        self.settings = settings or Settings()
-
-        # Маппинг латиницы в кириллицу для российских номеров
-        self.char_map = {
-            'O': 'О', 'o': 'о', '0': 'О',
-            'B': 'В', 'b': 'в',
-            'A': 'А', 'a': 'а',
-            'E': 'Е', 'e': 'е',
-            'K': 'К', 'k': 'к',
-            'M': 'М', 'm': 'м',
-            'H': 'Н', 'h': 'н',
-            'P': 'Р', 'p': 'р',
-            'C': 'С', 'c': 'с',
-            'T': 'Т', 't': 'т',
-            'Y': 'У', 'y': 'у',
-            'X': 'Х', 'x': 'х',
-        }
+    # Маппинг латиницы в кириллицу для российских номеров
+    char_map = {
+        'O': 'О', 'o': 'о', '0': 'О',
+        'B': 'В', 'b': 'в',
+        'A': 'А', 'a': 'а',
+        'E': 'Е', 'e': 'е',
+        'K': 'К', 'k': 'к',
+        'M': 'М', 'm': 'м',
+        'H': 'Н', 'h': 'н',
+        'P': 'Р', 'p': 'р',
+        'C': 'С', 'c': 'с',
+        'T': 'Т', 't': 'т',
+        'Y': 'У', 'y': 'у',
+        'X': 'Х', 'x': 'х',
+    }
 
-    def enhance_contrast(self, image: np.ndarray) -> np.ndarray:
-        """Улучшение контраста через CLAHE."""
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
+    # Таблицы str.translate строятся один раз при импорте
+    _cyrillic_table = str.maketrans(char_map)
+
+    # Обратное отображение для поиска по ASCII: кириллица → латиница.
+    # Заодно переводит в верхний регистр латиницу и кириллические двойники,
+    # так что отдельный проход .upper() не нужен
+    _latin_table = str.maketrans({
+        **{lat: lat.upper() for lat in string.ascii_lowercase},
+        **{cyr: lat.upper() for lat, cyr in char_map.items() if lat.isalpha()},
+        '0': 'O',
+    })
 
-        clahe = cv2.createCLAHE(
+    def __init__(self, settings: Settings | None = None):
+        self.settings = settings or get_settings()
+
+        # Объект CLAHE создаётся один раз (настройки неизменяемы).
+        # Не потокобезопасен: вызывается только из потока документа
+        self._clahe = cv2.createCLAHE(
             clipLimit=self.settings.clahe_clip_limit,
             tileGridSize=(self.settings.clahe_tile_size, self.settings.clahe_tile_size)
         )
-        return clahe.apply(gray)
+
+    def load_grayscale(self, image_path: str | Path) -> np.ndarray | None:
+        """Загрузка изображения сразу в оттенках серого.
+
+        Декодер пишет один канал вместо трёх, отдельный cvtColor не нужен.
+        Чтение через numpy поддерживает не-ASCII пути в Windows.
+        """
+        data = np.fromfile(str(image_path), dtype=np.uint8)
+        return cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+
+    def enhance_contrast(self, image: np.ndarray) -> np.ndarray:
+        """Улучшение контраста через CLAHE.
+
+        Ожидает изображение в оттенках серого: страницы декодируются сразу
+        в grayscale (см. `load_grayscale`), отдельной конвертации нет.
+        """
+        if image.ndim != 2:
+            raise ValueError(f"Ожидается изображение в оттенках серого, получено {image.shape}")
+
+        return self._clahe.apply(image)
 
     def extract_region(
         self,
@@ -54,19 +83,34 @@ class ImagePreprocessor:
 
     def normalize_to_cyrillic(self, text: str) -> str:
         """Конвертация латинских символов в кириллические эквиваленты."""
-        for lat, cyr in self.char_map.items():
-            text = text.replace(lat, cyr)
-        return text
+        return text.translate(self._cyrillic_table)
+
+    def normalize_to_latin(self, text: str) -> str:
+        """Конвертация кириллических двойников (и цифры 0) в латиницу.
+
+        Латиница и двойники приводятся к верхнему регистру в том же
+        проходе; остальные символы не меняются.
+        """
+        return text.translate(self._latin_table)
 
     def upscale_if_needed(self, image: np.ndarray) -> np.ndarray:
-        """Увеличение маленьких изображений для лучшего OCR."""
+        """Приведение высоты изображения к диапазону, удобному для OCR.
+
+        Маленькие изображения увеличиваются до `min_image_height`, слишком
+        большие уменьшаются до `max_image_height` — время OCR растёт
+        линейно с числом пикселей.
+        """
         height = image.shape[0]
         min_height = self.settings.min_image_height
+        max_height = self.settings.max_image_height
 
-        if height >= min_height:
+        if height < min_height:
+            scale = min_height / height
+        elif height > max_height:
+            scale = max_height / height
+        else:
             return image
 
-        scale = min_height / height
         new_width = int(image.shape[1] * scale)
         new_height = int(height * scale)
 
@@ -75,13 +119,31 @@ class ImagePreprocessor:
             "cubic": cv2.INTER_CUBIC,
             "lanczos": cv2.INTER_LANCZOS4
         }
-        method = interpolation_methods.get(
-            self.settings.upscale_method,
-            cv2.INTER_CUBIC
-        )
+        if scale < 1.0:
+            # Для уменьшения INTER_AREA и быстрее, и без алиасинга
+            method = cv2.INTER_AREA
+        else:
+            method = interpolation_methods.get(
+                self.settings.upscale_method,
+                cv2.INTER_CUBIC
+            )
 
         return cv2.resize(image, (new_width, new_height), interpolation=method)
 
+    def downscale_if_needed(self, image: np.ndarray) -> np.ndarray:
+        """Уменьшение изображения, если длинная сторона больше `max_region_side`.
+
+        Полноширинный регион скана с высоким DPI может быть шире нескольких
+        тысяч пикселей, а время OCR растёт с числом пикселей.
+        """
+        scale = self.settings.max_region_side / max(image.shape[:2])
+        if scale >= 1.0:
+            return image
+
+        new_width = int(image.shape[1] * scale)
+        new_height = int(image.shape[0] * scale)
+        return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+
     def preprocess_for_ocr(self, image: np.ndarray) -> np.ndarray:
         """Полный пайплайн предобработки для OCR."""
         upscaled = self.upscale_if_needed(image)
@@ -1,9 +1,18 @@
 """Tests for Vehicle OCR parser."""
 
+import json
+import os
+
+import cv2
+import numpy as np
 import pytest
 from pathlib import Path
 
+from pydantic import ValidationError
+
 from vehicle_ocr import VehicleParser, Settings
+from vehicle_ocr.config import get_settings
+from vehicle_ocr.parser import ExtractionResult, ResultsTable
 from vehicle_ocr.preprocessor import ImagePreprocessor
 
 
@@ -24,6 +33,46 @@ class TestImagePreprocessor:
         assert "В" in result  # Cyrillic В
         assert "О" in result  # Cyrillic О
 
+    def test_normalize_to_latin(self):
+        """Test Cyrillic look-alike to Latin conversion."""
+        preprocessor = ImagePreprocessor()
+
+        assert preprocessor.normalize_to_latin("В883ВО799") == "B883BO799"
+        assert preprocessor.normalize_to_latin("0") == "O"
+
+        # Other characters are left as is
+        assert preprocessor.normalize_to_latin("ДЖ 12") == "ДЖ 12"
+
+        # Upper-casing is fused into the same table, and it is idempotent
+        assert preprocessor.normalize_to_latin("в883bо799") == "B883BO799"
+        mixed = "vin: wp1zzz9pz9la42290 в883во799"
+        once = preprocessor.normalize_to_latin(mixed)
+        assert preprocessor.normalize_to_latin(once) == once
+        assert once == preprocessor.normalize_to_latin(mixed.upper())
+
+        # Round trip back to the display form
+        assert preprocessor.normalize_to_cyrillic("B883BO799") == "В883ВО799"
+
+    def test_enhance_contrast_grayscale_only(self):
+        """Test CLAHE accepts only single-channel images."""
+        preprocessor = ImagePreprocessor()
+
+        gray = np.full((64, 64), 128, dtype=np.uint8)
+        assert preprocessor.enhance_contrast(gray).shape == (64, 64)
+
+        with pytest.raises(ValueError):
+            preprocessor.enhance_contrast(np.zeros((64, 64, 3), dtype=np.uint8))
+
+    def test_downscale_if_needed(self):
+        """Test regions are shrunk only when the long side is too big."""
+        preprocessor = ImagePreprocessor(Settings(max_region_side=1000))
+
+        wide = np.zeros((300, 2000), dtype=np.uint8)
+        assert preprocessor.downscale_if_needed(wide).shape == (150, 1000)
+
+        small = np.zeros((300, 800), dtype=np.uint8)
+        assert preprocessor.downscale_if_needed(small) is small
+
 
 class TestSettings:
     """Tests for configuration."""
@@ -46,6 +95,14 @@ class TestSettings:
         assert settings.tesseract_lang == "eng"
         assert settings.clahe_clip_limit == 3.0
 
+    def test_get_settings_cached(self):
+        """Test settings singleton is built once and immutable."""
+        settings = get_settings()
+
+        assert get_settings() is settings
+        with pytest.raises(ValidationError):
+            settings.tesseract_psm = 3
+
 
 class TestVehicleParser:
     """Tests for main parser functionality."""
@@ -76,6 +133,257 @@ class TestVehicleParser:
         assert not parser.VIN_PATTERN.match("WP1ZZZ9PZOLA42290")  # Contains O
         assert not parser.VIN_PATTERN.match("WP1ZZZ9PZ9IA42290")  # Contains I
 
+    def test_vin_window_overlapping(self, parser):
+        """Test that every 17-char VIN window is found, including overlaps."""
+        cleaned = "XWP1ZZZ9PZ9LA42290"
+        expected = [
+            cleaned[i:i + 17]
+            for i in range(len(cleaned) - 16)
+            if parser.VIN_PATTERN.match(cleaned[i:i + 17])
+        ]
+
+        found = [m.group(1).decode() for m in parser._VIN_WINDOW.finditer(cleaned.encode())]
+
+        assert found == expected == ["XWP1ZZZ9PZ9LA4229", "WP1ZZZ9PZ9LA42290"]
+        assert not list(parser._VIN_WINDOW.finditer(b"WP1ZZZ9PZOLA42290"))
+
+    def test_vin_structure_scores(self, parser):
+        """Test vectorized VIN structure scoring."""
+        scores = parser._vin_structure_scores(
+            [b"WP1ZZZ9PZ9LA42290", b"1P1ZZZ9PZ9LA42290", b"WP1ZZZ9PZABCDEFGH"],
+            letter_weight=10
+        )
+
+        # Leading letter (+10) and digits in the serial part (positions 10-17)
+        assert scores.tolist() == [10 + 6, 6, 10 + 0]
+
+    def test_parse_reg_number(self, parser):
+        """Test registration number search in raw OCR text."""
+        # Pattern match after Latin -> Cyrillic normalization
+        assert parser._parse_reg_number("СВИДЕТЕЛЬСТВО\nB883BO799\n") == "В883ВО799"
+
+        # Line-by-line fallback
+        assert parser._parse_reg_number("8B83BO799") == "8В83ВО799"
+
+        assert parser._parse_reg_number("no plate here") is None
+
+    def test_vin_windows_and_select(self, parser):
+        """Test VIN candidate scan of OCR text and selection by structure."""
+        assert parser._vin_windows("# wp1zzz9pz9la42290") == [b"WP1ZZZ9PZ9LA42290"]
+        assert parser._vin_windows("nothing") == []
+
+        candidates = parser._vin_windows("VIN: WP1ZZZ9PZ9LA42290")
+        candidates += parser._vin_windows("WP1ZZZ9PZ9LA42290 xx")
+        assert parser._select_vin(candidates) == "WP1ZZZ9PZ9LA42290"
+        assert parser._select_vin([]) is None
+
+    def test_default_env_restored(self, monkeypatch):
+        """Test the worker environment override does not leak or clobber."""
+        from vehicle_ocr.parser import _default_env
+
+        monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+        with _default_env("OMP_THREAD_LIMIT", "1"):
+            assert os.environ["OMP_THREAD_LIMIT"] == "1"
+        assert "OMP_THREAD_LIMIT" not in os.environ
+
+        monkeypatch.setenv("OMP_THREAD_LIMIT", "4")
+        with _default_env("OMP_THREAD_LIMIT", "1"):
+            assert os.environ["OMP_THREAD_LIMIT"] == "4"
+
+    def test_list_images(self, parser, tmp_path):
+        """Test directory listing filters by extension and sorts paths."""
+        for name in ["b.PNG", "a.jpg", "c.tiff", "notes.txt"]:
+            (tmp_path / name).touch()
+        (tmp_path / "dir.jpg").mkdir()
+
+        assert [p.name for p in parser.list_images(tmp_path)] == ["a.jpg", "b.PNG", "c.tiff"]
+
+    def test_tesseract_config_whitelist(self, parser):
+        """Test per-field character whitelists in the Tesseract config."""
+        assert parser._tesseract_config(6) == "--psm 6"
+        assert parser._tesseract_config(3, parser._VIN_WHITELIST) == (
+            "--psm 3 -c tessedit_char_whitelist=ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+        )
+        assert not set("IOQ") & set(parser._VIN_WHITELIST)
+
+    def test_extract_vin_cascade(self, parser, monkeypatch):
+        """Test the second PSM pass runs only when the first finds no VIN."""
+        monkeypatch.setattr("vehicle_ocr.parser.PyTessBaseAPI", None)
+        image = np.zeros((1000, 600), dtype=np.uint8)
+        calls = []
+
+        def fake_ocr(texts):
+            def run(image, psm=None, whitelist=None):
+                calls.append(psm)
+                return texts[psm]
+            return run
+
+        monkeypatch.setattr(parser, "_run_ocr", fake_ocr({6: "WP1ZZZ9PZ9LA42290", 3: ""}))
+        assert parser.extract_vin(image, enhanced=True) == "WP1ZZZ9PZ9LA42290"
+        assert calls == [6]
+
+        calls.clear()
+        monkeypatch.setattr(parser, "_run_ocr", fake_ocr({6: "", 3: "WP1ZZZ9PZ9LA42290"}))
+        assert parser.extract_vin(image, enhanced=True) == "WP1ZZZ9PZ9LA42290"
+        assert calls == [6, 3]
+
+        # Windows glued across label lines do not end the cascade
+        garbage = "MAPKA MDEL LADA 210930\nTNP TC LEKVY 2009\nXTA2IO93OY1234567"
+        calls.clear()
+        monkeypatch.setattr(parser, "_run_ocr", fake_ocr({6: garbage, 3: "XTA210930Y1234567"}))
+        assert parser.extract_vin(image, enhanced=True) == "XTA210930Y1234567"
+        assert calls == [6, 3]
+
+        # A failing first pass still falls through to the second one
+        def failing_ocr(image, psm=None, whitelist=None):
+            if psm == 6:
+                raise RuntimeError("tesseract failed")
+            return "WP1ZZZ9PZ9LA42290"
+
+        monkeypatch.setattr(parser, "_run_ocr", failing_ocr)
+        assert parser.extract_vin(image, enhanced=True) == "WP1ZZZ9PZ9LA42290"
+
+    def test_batch_vin_cascade(self, parser, monkeypatch):
+        """Test batched VIN OCR re-runs only regions without a whole-token VIN."""
+        garbage = "MAPKA MDEL LADA 210930\nTNP TC LEKVY 2009"
+        calls = []
+
+        def fake_batch(images, psm, whitelist=None):
+            calls.append((len(images), psm))
+            if psm == 6:
+                return ["VIN WP1ZZZ9PZ9LA42290", garbage]
+            return ["XTA210930Y1234567"]
+
+        monkeypatch.setattr(parser, "batch_ocr", fake_batch)
+        regions = [np.zeros((10, 10), dtype=np.uint8)] * 2
+
+        candidates = parser._batch_vin_candidates(regions)
+
+        assert calls == [(2, 6), (1, 3)]
+        assert candidates[0] == [b"WP1ZZZ9PZ9LA42290"]
+        assert parser._select_vin(candidates[1]) == "XTA210930Y1234567"
+
+    def test_combined_region_ocr(self, parser, monkeypatch):
+        """Test one OCR pass over the union region can yield both fields."""
+        calls = []
+
+        def fake_ocr(image, psm=None, whitelist=None):
+            calls.append(whitelist)
+            return "B883BO799\nVIN WP1ZZZ9PZ9LA42290"
+
+        monkeypatch.setattr(parser, "_run_ocr", fake_ocr)
+        image = np.zeros((1000, 600), dtype=np.uint8)
+
+        assert parser._extract_both(image) == ("В883ВО799", "WP1ZZZ9PZ9LA42290")
+        assert calls == [parser._COMBINED_WHITELIST]
+
+    def test_combined_region_noise_falls_back(self, parser, monkeypatch):
+        """Test noisy combined OCR leaves fields to the targeted extractors."""
+        monkeypatch.setattr("vehicle_ocr.parser.PyTessBaseAPI", None)
+        calls = []
+
+        def fake_ocr(image, psm=None, whitelist=None):
+            calls.append(whitelist)
+            if whitelist == parser._COMBINED_WHITELIST:
+                # VIN read with O for 0, plate only as a broken line
+                return "8B83BO799\nXTA21O93OY1234567\nМАРКА LADA 21093"
+            if whitelist == parser._VIN_WHITELIST:
+                return "XTA210930Y1234567"
+            return "B883BO799"
+
+        monkeypatch.setattr(parser, "_run_ocr", fake_ocr)
+        monkeypatch.setattr(parser, "extract_body_number", lambda image: None)
+        image = np.zeros((1000, 600), dtype=np.uint8)
+
+        assert parser._extract_both(image) == (None, None)
+
+        calls.clear()
+        result = parser.parse_document("page.png", image)
+
+        assert result.reg_number == "В883ВО799"
+        assert result.vin == "XTA210930Y1234567"
+        assert calls == [
+            parser._COMBINED_WHITELIST,
+            parser._REG_NUMBER_WHITELIST,
+            parser._VIN_WHITELIST,
+        ]
+
+    def test_parse_document_decodes_once(self, parser, monkeypatch, tmp_path):
+        """Test all extractors share one grayscale decode of the page."""
+        path = tmp_path / "page.png"
+        cv2.imwrite(str(path), np.full((1000, 600, 3), 255, dtype=np.uint8))
+
+        loads = []
+        load_grayscale = parser.preprocessor.load_grayscale
+
+        def counting_load(image_path):
+            loads.append(image_path)
+            return load_grayscale(image_path)
+
+        monkeypatch.setattr(parser.preprocessor, "load_grayscale", counting_load)
+        monkeypatch.setattr(parser, "_run_ocr", lambda image, psm=None, whitelist=None: "")
+        monkeypatch.setattr(parser, "_run_ocr_modes", lambda image, psms, whitelist=None: ["" for _ in psms])
+
+        result = parser.parse_document(path)
+
+        assert loads == [path]
+        assert result.file == "page.png"
+        parser.close()
+
+    def test_sweep_skips_unreadable_region(self, parser, monkeypatch):
+        """Test the strategy sweep gives up early when OCR finds no candidates."""
+        calls = []
+
+        def fake_ocr(image, psm=None, whitelist=None):
+            calls.append(psm)
+            return "NO VIN"
+
+        monkeypatch.setattr(parser, "_run_ocr", fake_ocr)
+        image = np.zeros((400, 300), dtype=np.uint8)
+
+        assert parser.extract_body_number(image) is None
+        assert len(calls) < 36
+        parser.close()
+
+
+class TestResultsTable:
+    """Tests for columnar results storage and JSON output."""
+
+    @pytest.fixture
+    def table(self):
+        """Create a table with one complete and one empty row."""
+        table = ResultsTable()
+        table.append("a.jpg", "В883ВО799", "WP1ZZZ9PZ9LA42290", "WP1ZZZ9PZ9LA42290")
+        table.add(ExtractionResult(file="b.jpg"))
+        return table
+
+    def test_rows(self, table):
+        """Test iteration yields ExtractionResult rows in order."""
+        rows = list(table)
+
+        assert len(table) == 2
+        assert [r.file for r in rows] == ["a.jpg", "b.jpg"]
+        assert rows[0].vin == "WP1ZZZ9PZ9LA42290"
+        assert rows[1].reg_number is None
+        assert rows[1] == ExtractionResult(file="b.jpg")
+        assert table.to_dicts() == [r.to_dict() for r in rows]
+
+    def test_save_results(self, table, tmp_path):
+        """Test JSON output and statistics for a table and a plain list."""
+        output_path = tmp_path / "out" / "results.json"
+        parser = VehicleParser()
+
+        data = parser.save_results(table, output_path)
+
+        assert json.loads(output_path.read_text(encoding="utf-8")) == data
+        assert data["total_processed"] == 2
+        assert data["statistics"] == {
+            "reg_numbers_found": 1,
+            "vins_found": 1,
+            "body_numbers_found": 1
+        }
+        assert parser.save_results(list(table), output_path) == data
+
 
 class TestIntegration:
     """Integration tests with actual images."""